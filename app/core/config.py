@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from functools import lru_cache
+import os
+from functools import cached_property, lru_cache
 from pathlib import Path
 
 from pydantic import Field
@@ -22,21 +23,31 @@ class Settings(BaseSettings):
         env_file = ".env"
 
     @computed_field
-    @property
+    @cached_property
     def content_dir(self) -> Path:
         return self.data_dir / "content"
 
     @computed_field
-    @property
+    @cached_property
     def log_dir(self) -> Path:
         return self.data_dir / "logs"
 
 
+def _ensure_dir(path: Path) -> None:
+    try:
+        os.mkdir(path)
+    except FileExistsError:
+        if not os.path.isdir(path):
+            raise
+    except FileNotFoundError:
+        os.makedirs(path, exist_ok=True)
+
+
 @lru_cache
 def get_settings() -> Settings:
     settings = Settings()
-    settings.data_dir.mkdir(parents=True, exist_ok=True)
-    settings.content_dir.mkdir(parents=True, exist_ok=True)
-    settings.log_dir.mkdir(parents=True, exist_ok=True)
+    _ensure_dir(settings.data_dir)
+    _ensure_dir(settings.content_dir)
+    _ensure_dir(settings.log_dir)
     return settings
 
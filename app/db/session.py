@@ -1,7 +1,8 @@
 from __future__ import annotations
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect
 from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
 
 from app.core.config import get_settings
 from app.db.base import Base
@@ -9,6 +10,39 @@ from app.db.base import Base
 _engine = None
 SessionLocal: sessionmaker | None = None
 
+_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=268435456",
+)
+
+
+def _is_sqlite_memory(url: str) -> bool:
+    return url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+
+
+def _disable_pysqlite_transactions(dbapi_conn, connection_record) -> None:
+    # Let _begin_sqlite_transaction emit BEGIN instead of pysqlite's implicit deferred BEGIN.
+    dbapi_conn.isolation_level = None
+
+
+def _apply_sqlite_pragmas(dbapi_conn, connection_record) -> None:
+    cursor = dbapi_conn.cursor()
+    try:
+        for pragma in _SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+def _begin_sqlite_transaction(conn) -> None:
+    if conn.get_execution_options().get("sqlite_begin_immediate"):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    else:
+        conn.exec_driver_sql("BEGIN")
+
 
 def _ensure_engine() -> None:
     global _engine, SessionLocal
@@ -16,20 +50,45 @@ def _ensure_engine() -> None:
         return
 
     settings = get_settings()
-    connect_args = {"check_same_thread": False} if settings.database_url.startswith("sqlite") else {}
+    is_sqlite = settings.database_url.startswith("sqlite")
+    connect_args = {"check_same_thread": False} if is_sqlite else {}
+    pool_args: dict = {}
+    if is_sqlite and _is_sqlite_memory(settings.database_url):
+        pool_args = {"poolclass": StaticPool}
+    elif is_sqlite:
+        pool_args = {"poolclass": QueuePool, "pool_size": 5, "max_overflow": 10, "pool_pre_ping": False}
     _engine = create_engine(
         settings.database_url,
         echo=False,
         future=True,
         connect_args=connect_args,
+        **pool_args,
     )
+    if is_sqlite:
+        event.listen(_engine, "connect", _disable_pysqlite_transactions)
+        event.listen(_engine, "connect", _apply_sqlite_pragmas)
+        event.listen(_engine, "begin", _begin_sqlite_transaction)
     SessionLocal = sessionmaker(bind=_engine, autoflush=False, autocommit=False, future=True)
 
 
 def init_db() -> None:
+    import app.models  # noqa: F401  # register tables on Base.metadata
+
     _ensure_engine()
     assert _engine is not None
     Base.metadata.create_all(bind=_engine)
+    _upgrade_schema()
+
+
+def _upgrade_schema() -> None:
+    assert _engine is not None
+    content_columns = {column["name"] for column in inspect(_engine).get_columns("content")}
+    with _engine.begin() as conn:
+        if "manifest_hash" not in content_columns:
+            conn.exec_driver_sql("ALTER TABLE content ADD COLUMN manifest_hash VARCHAR")
+        if "index_warnings" not in content_columns:
+            conn.exec_driver_sql("ALTER TABLE content ADD COLUMN index_warnings TEXT")
+        conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_tasks_course_version ON tasks (course_id, version)")
 
 
 def reset_engine() -> None:
@@ -40,6 +99,13 @@ def reset_engine() -> None:
     SessionLocal = None
 
 
+def begin_write(session: Session) -> None:
+    # End a read transaction left open by earlier queries so BEGIN IMMEDIATE is actually emitted.
+    if session.in_transaction():
+        session.commit()
+    session.connection(execution_options={"sqlite_begin_immediate": True})
+
+
 def get_session() -> Session:
     _ensure_engine()
     assert SessionLocal is not None
@@ -4,6 +4,7 @@ from fastapi import FastAPI
 
 from app.db.session import init_db
 from app.routers import content_router
+from app.services.content import preload_schemas
 
 app = FastAPI(title="Algoritmika Offline API", version="0.1.0")
 
@@ -11,6 +12,7 @@ app = FastAPI(title="Algoritmika Offline API", version="0.1.0")
 @app.on_event("startup")
 def on_startup() -> None:
     init_db()
+    preload_schemas()
 
 
 @app.get("/health")
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from sqlalchemy import CheckConstraint, ForeignKey, Integer, String, Text
+from sqlalchemy import CheckConstraint, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
@@ -55,8 +55,16 @@ class Content(Base):
     title: Mapped[str] = mapped_column(String, nullable=False)
     installed_at: Mapped[int] = mapped_column(Integer, nullable=False)
     status: Mapped[str | None] = mapped_column(String, nullable=True)
+    manifest_hash: Mapped[str | None] = mapped_column(String, nullable=True)
+    index_warnings: Mapped[str | None] = mapped_column(Text, nullable=True, deferred=True)
 
-    tasks: Mapped[list[Task]] = relationship(back_populates="content", cascade="all, delete-orphan")
+    tasks: Mapped[list[Task]] = relationship(
+        back_populates="content",
+        primaryjoin="and_(Task.course_id==Content.id, Task.version==Content.version)",
+        foreign_keys="[Task.course_id, Task.version]",
+        order_by="Task.id",
+        viewonly=True,
+    )
 
 
 class Task(Base):
@@ -69,9 +77,12 @@ class Task(Base):
     json_path: Mapped[str | None] = mapped_column(String, nullable=True)
     folder_path: Mapped[str | None] = mapped_column(String, nullable=True)
 
+    __table_args__ = (Index("ix_tasks_course_version", "course_id", "version"),)
+
     content: Mapped[Content] = relationship(
         back_populates="tasks",
         primaryjoin="and_(Task.course_id==Content.id, Task.version==Content.version)",
+        foreign_keys="[Task.course_id, Task.version]",
         viewonly=True,
     )
     submissions: Mapped[list[Submission]] = relationship(back_populates="task")
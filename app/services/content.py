@@ -1,177 +1,258 @@
 from __future__ import annotations
 
+import hashlib
 import json
-import shutil
+import os
 import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Iterable
+from typing import Callable, Iterable
 from zipfile import ZipFile
 
+import fastjsonschema
 from fastapi import HTTPException, UploadFile, status
 from jsonschema import Draft7Validator
-from sqlalchemy import delete
+from sqlalchemy import Row, delete, func, insert, select
 from sqlalchemy.orm import Session
 
 from app.core.config import get_settings
+from app.db.session import begin_write
 from app.models import Content, Task
 from app.schemas.content import ContentImportResult
 
-_SCHEMAS_CACHE: dict[str, Draft7Validator] = {}
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speedup
+    _json_loads = json.loads
+else:
+    _json_loads = orjson.loads
 
+_SCHEMA_NAMES = ("task.schema", "task_folder.schema", "manifest.schema")
 
-def _load_schema(name: str) -> Draft7Validator:
-    if name in _SCHEMAS_CACHE:
-        return _SCHEMAS_CACHE[name]
 
+@lru_cache(maxsize=None)
+def _load_schema(name: str) -> Draft7Validator:
     schema_path = Path(__file__).resolve().parent.parent / "schemas" / "json" / f"{name}.json"
-    if not schema_path.exists():
-        raise RuntimeError(f"Schema '{name}' not found at {schema_path}")
-    with schema_path.open("r", encoding="utf-8") as fh:
-        schema_data = json.load(fh)
-    validator = Draft7Validator(schema_data)
-    _SCHEMAS_CACHE[name] = validator
-    return validator
+    try:
+        schema_data = json.loads(schema_path.read_bytes())
+    except FileNotFoundError:
+        raise RuntimeError(f"Schema '{name}' not found at {schema_path}") from None
+    return Draft7Validator(schema_data)
+
+
+@lru_cache(maxsize=None)
+def _schema_validator(name: str) -> Callable[[dict], list[str]]:
+    validator = _load_schema(name)
+    fast_validate = fastjsonschema.compile(validator.schema, use_default=False)
+
+    def validate(data: dict) -> list[str]:
+        try:
+            fast_validate(data)
+        except fastjsonschema.JsonSchemaValueException:
+            pass
+        else:
+            return []
+
+        # Collect every violation with the reference validator only for invalid documents.
+        errors = sorted(validator.iter_errors(data), key=lambda e: e.path)
+        return [f"{'.'.join(map(str, error.path))}: {error.message}" for error in errors]
+
+    return validate
+
+
+def preload_schemas() -> None:
+    for name in _SCHEMA_NAMES:
+        _schema_validator(name)
 
 
 def _validate_json(data: dict, schema_name: str) -> list[str]:
-    validator = _load_schema(schema_name)
-    errors = sorted(validator.iter_errors(data), key=lambda e: e.path)
-    return [f"{'.'.join(map(str, error.path))}: {error.message}" for error in errors]
+    return _schema_validator(schema_name)(data)
 
 
-def _ensure_single_root(temp_dir: Path) -> Path:
-    entries = [p for p in temp_dir.iterdir() if not p.name.startswith("__MACOSX")]
-    if len(entries) == 1 and entries[0].is_dir():
-        return entries[0]
-    return temp_dir
+def _archive_root_prefix(zf: ZipFile) -> str:
+    names = [n for n in zf.namelist() if not n.startswith("__MACOSX")]
+    roots = {n.split("/", 1)[0] for n in names}
+    if len(roots) == 1 and all("/" in n for n in names):
+        return f"{roots.pop()}/"
+    return ""
 
 
-def _iter_task_descriptors(tasks_dir: Path) -> Iterable[Path]:
-    seen: set[Path] = set()
-    for path in sorted(tasks_dir.rglob("*")):
-        candidate: Path | None = None
-        if path.is_dir() and (path / "task.json").exists():
-            candidate = path / "task.json"
-        elif path.is_file() and path.suffix.lower() == ".json":
-            candidate = path
+def _iter_task_descriptors(tasks_dir: Path, *, _is_root: bool = True) -> Iterable[Path]:
+    with os.scandir(tasks_dir) as it:
+        entries = sorted(it, key=lambda e: e.name)
 
-        if candidate and candidate not in seen:
-            seen.add(candidate)
-            yield candidate
+    if not _is_root and any(e.name == "task.json" and e.is_file() for e in entries):
+        yield tasks_dir / "task.json"
+        return
+
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from _iter_task_descriptors(Path(entry.path), _is_root=False)
+        elif entry.is_file() and entry.name.lower().endswith(".json"):
+            yield Path(entry.path)
 
 
 def _relative_to_course(path: Path, course_root: Path) -> Path:
     return path.relative_to(course_root)
 
 
+def _parse_and_validate(
+    descriptor_path: Path,
+    *,
+    task_validator: Callable[[dict], list[str]],
+    folder_validator: Callable[[dict], list[str]],
+) -> tuple[Path, bool, dict, list[str]]:
+    is_folder = descriptor_path.name == "task.json"
+    validate = folder_validator if is_folder else task_validator
+    task_data = _json_loads(descriptor_path.read_bytes())
+    return descriptor_path, is_folder, task_data, validate(task_data)
+
+
+def _content_hash(course_dir: Path, manifest_bytes: bytes) -> str:
+    digest = hashlib.sha256(manifest_bytes)
+    tasks_dir = course_dir / "tasks"
+    if tasks_dir.is_dir():
+        for descriptor_path in _iter_task_descriptors(tasks_dir):
+            stat = descriptor_path.stat()
+            rel_path = descriptor_path.relative_to(course_dir).as_posix()
+            digest.update(f"\0{rel_path}\0{stat.st_mtime_ns}\0{stat.st_size}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _parse_course_tasks(course_dir: Path, course_id: str, version: str) -> tuple[list[dict], list[str]]:
+    tasks_dir = course_dir / "tasks"
+    warnings: list[str] = []
+    task_rows: list[dict] = []
+
+    parse = partial(
+        _parse_and_validate,
+        task_validator=_schema_validator("task.schema"),
+        folder_validator=_schema_validator("task_folder.schema"),
+    )
+    parsed: list[tuple[Path, bool, dict, list[str]]] = []
+    if tasks_dir.exists():
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            parsed = list(executor.map(parse, _iter_task_descriptors(tasks_dir)))
+
+    for descriptor_path, is_folder, task_data, errors in parsed:
+        if errors:
+            warnings.append(f"{_relative_to_course(descriptor_path, course_dir)}: {'; '.join(errors)}")
+            continue
+
+        task_id = task_data["id"]
+        kind = task_data["kind"]
+        rel_path = _relative_to_course(descriptor_path, course_dir)
+        if is_folder:
+            json_path: str | None = None
+            folder_path: str | None = str(rel_path.parent)
+        else:
+            json_path = str(rel_path)
+            folder_path = None
+
+        task_rows.append(
+            {
+                "id": task_id,
+                "course_id": course_id,
+                "version": version,
+                "kind": kind,
+                "json_path": json_path,
+                "folder_path": folder_path,
+            }
+        )
+
+    return task_rows, warnings
+
+
 def _index_course(
     session: Session,
-    course_dir: Path,
     manifest: dict,
+    task_rows: list[dict],
+    warnings: list[str],
     *,
-    installed_at_ts: int | None = None,
+    installed_at_ts: int,
+    manifest_hash: str | None = None,
 ) -> ContentImportResult:
     course_id = manifest["id"]
     version = manifest["version"]
     title = manifest.get("title", course_id)
 
-    if installed_at_ts is None:
-        existing = (
-            session.query(Content)
-            .filter(Content.id == course_id, Content.version == version)
-            .one_or_none()
+    session.execute(delete(Content).where(Content.id == course_id, Content.version == version))
+    session.execute(delete(Task).where(Task.course_id == course_id, Task.version == version))
+
+    session.execute(
+        insert(Content).values(
+            id=course_id,
+            version=version,
+            title=title,
+            installed_at=installed_at_ts,
+            status="installed",
+            manifest_hash=manifest_hash,
+            index_warnings=json.dumps(warnings, ensure_ascii=False) if warnings else None,
         )
-        installed_at_ts = existing.installed_at if existing else int(time.time())
+    )
+    if task_rows:
+        session.execute(insert(Task), task_rows)
 
-    session.execute(delete(Content).where(Content.id == course_id, Content.version == version))
+    installed_at = datetime.fromtimestamp(installed_at_ts, tz=timezone.utc)
 
-    content = Content(
-        id=course_id,
+    return ContentImportResult(
+        course_id=course_id,
         version=version,
         title=title,
-        installed_at=installed_at_ts,
-        status="installed",
+        installed_at=installed_at,
+        tasks_indexed=len(task_rows),
+        warnings=list(warnings),
     )
-    session.add(content)
-    session.flush()
 
-    session.execute(delete(Task).where(Task.course_id == course_id, Task.version == version))
-
-    tasks_dir = course_dir / "tasks"
-    warnings: list[str] = []
-    indexed = 0
-
-    if tasks_dir.exists():
-        for descriptor_path in _iter_task_descriptors(tasks_dir):
-            if descriptor_path.name == "task.json":
-                schema_name = "task_folder.schema"
-            else:
-                schema_name = "task.schema"
 
-            with descriptor_path.open("r", encoding="utf-8") as fh:
-                task_data = json.load(fh)
+def _stored_contents(session: Session) -> dict[tuple[str, str], Row]:
+    rows = session.execute(
+        select(
+            Content.id,
+            Content.version,
+            Content.title,
+            Content.installed_at,
+            Content.manifest_hash,
+            Content.index_warnings,
+        )
+    )
+    return {(row.id, row.version): row for row in rows}
 
-            errors = _validate_json(task_data, schema_name)
-            if errors:
-                warnings.append(f"{_relative_to_course(descriptor_path, course_dir)}: {'; '.join(errors)}")
-                continue
 
-            task_id = task_data["id"]
-            kind = task_data["kind"]
-            rel_path = _relative_to_course(descriptor_path, course_dir)
-            if descriptor_path.name == "task.json":
-                json_path: str | None = None
-                folder_path: str | None = str(rel_path.parent)
-            else:
-                json_path = str(rel_path)
-                folder_path = None
-
-            session.add(
-                Task(
-                    id=task_id,
-                    course_id=course_id,
-                    version=version,
-                    kind=kind,
-                    json_path=json_path,
-                    folder_path=folder_path,
-                )
-            )
-            indexed += 1
+def _task_counts(session: Session) -> dict[tuple[str, str], int]:
+    rows = session.execute(
+        select(Task.course_id, Task.version, func.count()).group_by(Task.course_id, Task.version)
+    )
+    return {(course_id, version): count for course_id, version, count in rows}
 
-    installed_at = datetime.fromtimestamp(installed_at_ts, tz=timezone.utc)
 
+def _unchanged_course_result(manifest: dict, stored: Row, tasks_indexed: int) -> ContentImportResult:
     return ContentImportResult(
-        course_id=course_id,
-        version=version,
-        title=title,
-        installed_at=installed_at,
-        tasks_indexed=indexed,
-        warnings=warnings,
+        course_id=manifest["id"],
+        version=manifest["version"],
+        title=stored.title,
+        installed_at=datetime.fromtimestamp(stored.installed_at, tz=timezone.utc),
+        tasks_indexed=tasks_indexed,
+        warnings=json.loads(stored.index_warnings) if stored.index_warnings else [],
     )
 
 
 def import_course_archive(session: Session, upload: UploadFile) -> ContentImportResult:
     settings = get_settings()
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        tmp_path = Path(tmpdir)
-        archive_path = tmp_path / "upload.zip"
-        with archive_path.open("wb") as buffer:
-            shutil.copyfileobj(upload.file, buffer)
-
-        extract_dir = tmp_path / "extracted"
-        with ZipFile(archive_path) as zf:
-            zf.extractall(extract_dir)
-
-        course_root = _ensure_single_root(extract_dir)
-        manifest_path = course_root / "manifest.json"
-        if not manifest_path.exists():
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="manifest.json not found")
-
-        with manifest_path.open("r", encoding="utf-8") as fh:
-            manifest = json.load(fh)
+    upload.file.seek(0)
+    with ZipFile(upload.file) as zf:
+        root_prefix = _archive_root_prefix(zf)
+        try:
+            manifest_bytes = zf.read(f"{root_prefix}manifest.json")
+        except KeyError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="manifest.json not found"
+            ) from None
+        manifest = _json_loads(manifest_bytes)
 
         manifest_errors = _validate_json(manifest, "manifest.schema")
         if manifest_errors:
@@ -181,28 +262,54 @@ def import_course_archive(session: Session, upload: UploadFile) -> ContentImport
             )
 
         destination = settings.content_dir / manifest["id"] / manifest["version"]
-        if destination.exists():
-            shutil.rmtree(destination)
         destination.parent.mkdir(parents=True, exist_ok=True)
-        shutil.move(str(course_root), destination)
+
+        staging_dir = settings.content_dir / ".tmp"
+        staging_dir.mkdir(exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=staging_dir) as tmpdir:
+            tmp_path = Path(tmpdir)
+            extract_dir = tmp_path / "extracted"
+            zf.extractall(extract_dir)
+
+            course_root = extract_dir / root_prefix if root_prefix else extract_dir
+            if destination.exists():
+                os.replace(destination, tmp_path / "previous")
+            os.replace(course_root, destination)
 
     installed_at_ts = int(time.time())
-    return _index_course(session, destination, manifest, installed_at_ts=installed_at_ts)
+    manifest_hash = _content_hash(destination, manifest_bytes)
+    task_rows, warnings = _parse_course_tasks(destination, manifest["id"], manifest["version"])
+
+    begin_write(session)
+    return _index_course(
+        session,
+        manifest,
+        task_rows,
+        warnings,
+        installed_at_ts=installed_at_ts,
+        manifest_hash=manifest_hash,
+    )
 
 
 def scan_content_root(session: Session) -> list[ContentImportResult]:
     settings = get_settings()
-    results: list[ContentImportResult] = []
+    stored_by_key = _stored_contents(session)
+    task_counts = _task_counts(session)
+    results: list[ContentImportResult | None] = []
+    pending: list[tuple[int, dict, str, str | None, list[dict], list[str]]] = []
+    seen_keys: set[tuple[str, str]] = set()
 
     for course_dir in sorted(settings.content_dir.iterdir()):
-        if not course_dir.is_dir():
+        if course_dir.name.startswith(".") or not course_dir.is_dir():
             continue
         for version_dir in sorted(course_dir.iterdir()):
-            if not version_dir.is_dir():
+            if version_dir.name.startswith(".") or not version_dir.is_dir():
                 continue
 
             manifest_path = version_dir / "manifest.json"
-            if not manifest_path.exists():
+            try:
+                manifest_bytes = manifest_path.read_bytes()
+            except FileNotFoundError:
                 installed_at = datetime.fromtimestamp(int(version_dir.stat().st_mtime), tz=timezone.utc)
                 results.append(
                     ContentImportResult(
@@ -216,8 +323,7 @@ def scan_content_root(session: Session) -> list[ContentImportResult]:
                 )
                 continue
 
-            with manifest_path.open("r", encoding="utf-8") as fh:
-                manifest = json.load(fh)
+            manifest = _json_loads(manifest_bytes)
 
             manifest.setdefault("id", course_dir.name)
             manifest.setdefault("version", version_dir.name)
@@ -227,10 +333,46 @@ def scan_content_root(session: Session) -> list[ContentImportResult]:
             if errors:
                 warning = f"manifest.json: {'; '.join(errors)}"
 
-            result = _index_course(session, version_dir, manifest, installed_at_ts=None)
+            key = (manifest["id"], manifest["version"])
+            manifest_hash = _content_hash(version_dir, manifest_bytes)
+            stored = stored_by_key.get(key)
+            # A key seen earlier in this scan is always reindexed so the last directory wins.
+            if key not in seen_keys and stored is not None and stored.manifest_hash == manifest_hash:
+                result = _unchanged_course_result(manifest, stored, task_counts.get(key, 0))
+                if warning:
+                    result.warnings.append(warning)
+                results.append(result)
+            else:
+                task_rows, task_warnings = _parse_course_tasks(version_dir, manifest["id"], manifest["version"])
+                pending.append((len(results), manifest, manifest_hash, warning, task_rows, task_warnings))
+                results.append(None)
+            seen_keys.add(key)
+
+    if pending:
+        begin_write(session)
+        # Re-read under the write lock: another writer may have indexed the same content meanwhile.
+        stored_by_key = _stored_contents(session)
+        locked_task_counts: dict[tuple[str, str], int] | None = None
+        written_keys: set[tuple[str, str]] = set()
+        for position, manifest, manifest_hash, warning, task_rows, task_warnings in pending:
+            key = (manifest["id"], manifest["version"])
+            stored = stored_by_key.get(key)
+            if key not in written_keys and stored is not None and stored.manifest_hash == manifest_hash:
+                if locked_task_counts is None:
+                    locked_task_counts = _task_counts(session)
+                result = _unchanged_course_result(manifest, stored, locked_task_counts.get(key, 0))
+            else:
+                result = _index_course(
+                    session,
+                    manifest,
+                    task_rows,
+                    task_warnings,
+                    installed_at_ts=stored.installed_at if stored is not None else int(time.time()),
+                    manifest_hash=manifest_hash,
+                )
+                written_keys.add(key)
             if warning:
                 result.warnings.append(warning)
-            results.append(result)
-
-    return results
+            results[position] = result
 
+    return [result for result in results if result is not None]
@@ -10,6 +10,7 @@ from fastapi.testclient import TestClient
 
 from app.core.config import get_settings
 import app.db.session as session_module
+from app.services.content import _iter_task_descriptors
 
 
 @pytest.fixture()
@@ -28,11 +29,10 @@ def test_client(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> TestClient:
 
     main_module = reload(main_module)
 
-    client = TestClient(main_module.app)
     try:
-        yield client
+        with TestClient(main_module.app) as client:
+            yield client
     finally:
-        client.close()
         session_module.reset_engine()
         get_settings.cache_clear()
 
@@ -99,3 +99,109 @@ def test_scan_content(test_client: TestClient, tmp_path: Path) -> None:
     assert data["imported"][0]["course_id"] == "py-basics"
     assert data["imported"][0]["tasks_indexed"] == 1
 
+
+def test_reimport_archive_with_root_folder(test_client: TestClient, tmp_path: Path) -> None:
+    archive = build_course_archive(tmp_path)
+    wrapped = tmp_path / "wrapped.zip"
+    with ZipFile(archive) as src, ZipFile(wrapped, "w") as dst:
+        for item in src.infolist():
+            dst.writestr(f"py-basics/{item.filename}", src.read(item))
+
+    for _ in range(2):
+        with wrapped.open("rb") as fh:
+            response = test_client.post("/content/import", files={"file": ("course.zip", fh, "application/zip")})
+        assert response.status_code == 200
+        assert response.json()["tasks_indexed"] == 1
+
+    installed = get_settings().content_dir / "py-basics" / "1.0.0"
+    assert (installed / "manifest.json").is_file()
+    assert (installed / "tasks" / "sum_two_numbers.json").is_file()
+    assert sorted(p.name for p in get_settings().content_dir.iterdir()) == [".tmp", "py-basics"]
+    assert list((get_settings().content_dir / ".tmp").iterdir()) == []
+
+    response = test_client.post("/content/scan")
+    assert [r["course_id"] for r in response.json()["imported"]] == ["py-basics"]
+
+
+def test_import_without_manifest_is_rejected(test_client: TestClient, tmp_path: Path) -> None:
+    archive = tmp_path / "broken.zip"
+    with ZipFile(archive, "w") as zf:
+        zf.writestr("tasks/sum_two_numbers.json", "{}")
+
+    with archive.open("rb") as fh:
+        response = test_client.post("/content/import", files={"file": ("broken.zip", fh, "application/zip")})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "manifest.json not found"
+
+
+def test_scan_reindexes_changed_course(test_client: TestClient, tmp_path: Path) -> None:
+    archive = build_course_archive(tmp_path)
+    with archive.open("rb") as fh:
+        test_client.post("/content/import", files={"file": ("course.zip", fh, "application/zip")})
+
+    response = test_client.post("/content/scan")
+    assert response.json()["imported"][0]["tasks_indexed"] == 1
+
+    tasks_dir = get_settings().content_dir / "py-basics" / "1.0.0" / "tasks"
+    task = json.loads((tasks_dir / "sum_two_numbers.json").read_text(encoding="utf-8"))
+    task["id"] = "sum_again"
+    (tasks_dir / "sum_again.json").write_text(json.dumps(task), encoding="utf-8")
+
+    response = test_client.post("/content/scan")
+    assert response.json()["imported"][0]["tasks_indexed"] == 2
+    response = test_client.get("/content")
+    assert [t["id"] for t in response.json()[0]["tasks"]] == ["sum_again", "sum_two_numbers"]
+
+
+def test_scan_keeps_reporting_invalid_descriptors(test_client: TestClient, tmp_path: Path) -> None:
+    archive = build_course_archive(tmp_path)
+    with archive.open("rb") as fh:
+        test_client.post("/content/import", files={"file": ("course.zip", fh, "application/zip")})
+
+    tasks_dir = get_settings().content_dir / "py-basics" / "1.0.0" / "tasks"
+    (tasks_dir / "bad.json").write_text(json.dumps({"id": "bad"}), encoding="utf-8")
+
+    for _ in range(2):
+        response = test_client.post("/content/scan")
+        result = response.json()["imported"][0]
+        assert result["tasks_indexed"] == 1
+        assert len(result["warnings"]) == 1
+        assert result["warnings"][0].startswith("tasks/bad.json: ")
+
+
+def test_scan_with_duplicate_manifest_keys_keeps_last_course(test_client: TestClient) -> None:
+    content_dir = get_settings().content_dir
+    for course_dir_name, title in (("a", "First"), ("b", "Second")):
+        version_dir = content_dir / course_dir_name / "1.0.0"
+        version_dir.mkdir(parents=True)
+        manifest = {"id": "x", "version": "1.0.0", "title": title}
+        (version_dir / "manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
+
+    response = test_client.post("/content/scan")
+    assert response.status_code == 200
+    assert [r["course_id"] for r in response.json()["imported"]] == ["x", "x"]
+
+    response = test_client.get("/content")
+    assert [(c["id"], c["title"]) for c in response.json()] == [("x", "Second")]
+
+    manifest = {"id": "x", "version": "1.0.0", "title": "First, edited"}
+    (content_dir / "a" / "1.0.0" / "manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
+    test_client.post("/content/scan")
+    response = test_client.get("/content")
+    assert [(c["id"], c["title"]) for c in response.json()] == [("x", "Second")]
+
+def test_iter_task_descriptors_yields_each_descriptor_once(tmp_path: Path) -> None:
+    tasks_dir = tmp_path / "tasks"
+    (tasks_dir / "factorial" / "tests").mkdir(parents=True)
+    (tasks_dir / "loops").mkdir()
+    for rel_path in (
+        "sum_two_numbers.json",
+        "factorial/task.json",
+        "factorial/tests/fixture.json",
+        "loops/max_of_three.json",
+        "README.md",
+    ):
+        (tasks_dir / rel_path).write_text("{}", encoding="utf-8")
+
+    descriptors = [p.relative_to(tasks_dir).as_posix() for p in _iter_task_descriptors(tasks_dir)]
+    assert descriptors == ["factorial/task.json", "loops/max_of_three.json", "sum_two_numbers.json"]